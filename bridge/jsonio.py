@@ -0,0 +1,13 @@
+"""JSON encode/decode for the bridge: orjson when installed, stdlib json otherwise."""
+
+import json
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so handlers are shared.
+# dumps returns compact UTF-8 bytes either way.
+try:
+    from orjson import dumps, loads
+except ImportError:
+    from json import loads
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
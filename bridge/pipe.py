@@ -11,10 +11,11 @@ Multi-agent:   python pipe.py --group doug-squad
 """
 
 import argparse
+import collections
+import functools
 import io
 import json
 import os
-import queue
 import re
 import signal
 import shutil
@@ -31,13 +32,14 @@ sys.path.insert(0, str(Path(__file__).resolve().parent))
 # Load .env
 _env_file = Path(__file__).parent / ".env"
 if _env_file.exists():
-    for _line in _env_file.read_text().splitlines():
-        _line = _line.strip()
-        if _line and not _line.startswith("#") and "=" in _line:
-            _key, _, _val = _line.partition("=")
-            _key, _val = _key.strip(), _val.strip()
-            if _val and _key not in os.environ:
-                os.environ[_key] = _val
+    with open(_env_file) as _f:
+        for _line in _f:
+            _line = _line.strip()
+            if _line and not _line.startswith("#") and "=" in _line:
+                _key, _, _val = _line.partition("=")
+                _key, _val = _key.strip(), _val.strip()
+                if _val and _key not in os.environ:
+                    os.environ[_key] = _val
 
 # ── Subprocess tracking (for clean Ctrl+C shutdown) ───────────
 _active_procs: list[subprocess.Popen] = []
@@ -72,8 +74,7 @@ class TeeWriter:
 
     def write(self, data):
         self.stream.write(data)
-        self.log_file.write(data)
-        self.log_file.flush()
+        self.log_file.write(data)  # line-buffered, flushes itself
 
     def flush(self):
         self.stream.flush()
@@ -101,13 +102,13 @@ def setup_logging(log_dir: Path) -> Path | None:
         return None
 
 
-from rcon import RCONClient, ThreadSafeRCON
-from paths import find_script_output, find_factorioctl_mcp
-from transport import (InputWatcher, send_response, send_tool_status, set_status,
-                       check_mod_loaded, register_agent, unregister_agent,
-                       pre_place_character, setup_surfaces, set_spectator_mode)
-from paths import find_mod_source, find_mods_dir
-from telemetry import SSEBroadcaster, start_sse_server, RelayPusher, Telemetry, emit_chat, emit_tool_call, emit_error, emit_status
+from rcon import RCONClient, RCONPool, ThreadSafeRCON
+from paths import find_script_output, find_factorioctl_mcp, find_mod_source, find_mods_dir
+from transport import (InputWatcher, send_response, stream_response, send_tool_status, set_status,
+                       register_agents, pre_place_character, setup_surfaces,
+                       set_spectator_mode)
+from telemetry import SSEBroadcaster, start_sse_server, RelayPusher, Telemetry, emit_chat, emit_error
+from jsonio import dumps as _json_dumps, loads as _json_loads
 
 _BRIDGE_DIR = Path(__file__).resolve().parent
 SESSIONS_FILE = _BRIDGE_DIR / ".sessions.json"
@@ -118,12 +119,24 @@ def load_agent(agent_name: str) -> dict:
     """Load and validate agent profile from bridge/agents/{name}.json.
     If response_format is present, auto-generates and appends format instructions."""
     agent_file = _BRIDGE_DIR / "agents" / f"{agent_name}.json"
-    if not agent_file.exists():
+    try:
+        st = agent_file.stat()
+    except FileNotFoundError:
         raise FileNotFoundError(
             f"Agent profile not found: {agent_file}\n"
             f"Create it or use --agent default"
-        )
-    agent = json.loads(agent_file.read_text())
+        ) from None
+    return _load_agent_file(agent_file, st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=64)
+def _load_agent_file(agent_file: Path, mtime_ns: int, size: int) -> dict:
+    """Parse one profile. Keyed on mtime/size so edits on disk are picked up."""
+    return _finalize_agent(_json_loads(agent_file.read_bytes()), agent_file)
+
+
+def _finalize_agent(agent: dict, agent_file: Path) -> dict:
+    """Validate a parsed profile and expand its response_format."""
     # Validate required fields (per agent.schema.json)
     if not isinstance(agent.get("name"), str) or not agent["name"]:
         raise ValueError(f"Agent profile missing 'name': {agent_file}")
@@ -139,15 +152,31 @@ def load_agent(agent_name: str) -> dict:
 
 # ── Response formatting ───────────────────────────────────────
 
+def _freeze(obj):
+    """Hashable form of a JSON value: dicts -> sorted item tuples, lists -> tuples."""
+    if isinstance(obj, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
 def build_format_instructions(fmt: dict) -> str:
     """Generate system prompt formatting instructions from response_format config."""
+    return _format_instructions(_freeze(fmt))
+
+
+@functools.lru_cache(maxsize=64)
+def _format_instructions(fmt_key: tuple) -> str:
+    # Agents in a squad usually share one response_format; build it once
+    fmt = dict(fmt_key)
     header_label = fmt.get("header_label", "STATUS")
     header_color = fmt.get("header_color", "1,0.8,0.2")
     action_label = fmt.get("action_label", "ACTIONS")
     action_color = fmt.get("action_color", "0.6,0.8,1")
     footer_label = fmt.get("footer_label")
     footer_color = fmt.get("footer_color", "0.4,0.6,0.4")
-    sections = fmt.get("sections", [])
+    sections = [dict(sec) for sec in fmt.get("sections", ())]
 
     lines = [
         "OUTPUT FORMAT — you MUST use these exact Factorio rich text tags in every response.",
@@ -158,11 +187,10 @@ def build_format_instructions(fmt: dict) -> str:
         "",
         "  <body paragraphs — use [item=iron-plate] for items, [entity=stone-furnace] for buildings>",
     ]
-    if True:  # always include actions
-        lines.append("")
-        lines.append(f"  [color={action_color}]{action_label}:[/color]")
-        lines.append("  - action one")
-        lines.append("  - action two")
+    lines.append("")
+    lines.append(f"  [color={action_color}]{action_label}:[/color]")
+    lines.append("  - action one")
+    lines.append("  - action two")
     for sec in sections:
         color = sec.get("color", "0.5,0.7,0.5")
         lines.append("")
@@ -184,6 +212,8 @@ _SECTION_RE = re.compile(
 def parse_response(text: str) -> dict:
     """Parse a rich-text agent response into structured sections.
     Returns dict matching response.schema.json. Falls back to {"body": text}."""
+    if "[color=" not in text:  # plain replies need no regex scan
+        return {"body": text}
     matches = list(_SECTION_RE.finditer(text))
     if not matches:
         return {"body": text}
@@ -225,16 +255,27 @@ def parse_response(text: str) -> dict:
     return result
 
 
+# One pass over the reply: **bold** -> bold, drop ## headers and code fences
+_MARKDOWN_RE = re.compile(r'\*\*(?P<bold>.+?)\*\*|^#{1,3}\s+|```\w*\n?', re.MULTILINE)
+
+
+def _strip_markdown(m: re.Match) -> str:
+    return m.group("bold") or ""
+
+
 def sanitize_response(text: str) -> str:
     """Remove markdown artifacts while preserving Factorio rich text tags."""
-    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)           # **bold** -> bold
-    text = re.sub(r'^#{1,3}\s+', '', text, flags=re.MULTILINE)  # ## headers
-    text = re.sub(r'```\w*\n?', '', text)                   # code fences
-    return text.strip()
+    return _MARKDOWN_RE.sub(_strip_markdown, text).strip()
 
 
 # ── Session persistence ──────────────────────────────────────
 
+# Session ID last written to each per-agent file. The persistent worker
+# usually reports the same session every turn, so save_session() can skip
+# the rewrite with a dict compare. Each agent thread only touches its own key.
+_saved_sessions: dict[str, str] = {}
+
+
 def _session_file(agent_name: str) -> Path:
     return _BRIDGE_DIR / f".session-{agent_name}.json"
 
@@ -245,14 +286,17 @@ def load_session(agent_name: str) -> str | None:
     f = _session_file(agent_name)
     if f.exists():
         try:
-            data = json.loads(f.read_text())
-            return data.get("session_id")
+            data = _json_loads(f.read_bytes())
         except (json.JSONDecodeError, OSError):
             return None
+        session_id = data.get("session_id")
+        if session_id:
+            _saved_sessions[agent_name] = session_id
+        return session_id
     # Backward compat: check old shared file
     if SESSIONS_FILE.exists():
         try:
-            data = json.loads(SESSIONS_FILE.read_text())
+            data = _json_loads(SESSIONS_FILE.read_bytes())
             return data.get(agent_name)
         except (json.JSONDecodeError, OSError):
             return None
@@ -260,9 +304,16 @@ def load_session(agent_name: str) -> str | None:
 
 
 def save_session(agent_name: str, session_id: str):
-    """Persist session ID for an agent (per-agent file, thread-safe)."""
+    """Persist session ID for an agent (per-agent file, thread-safe).
+    No-op if the file already holds this ID."""
+    if _saved_sessions.get(agent_name) == session_id:
+        return
     f = _session_file(agent_name)
-    f.write_text(json.dumps({"session_id": session_id}) + "\n")
+    # Write-then-rename so a crash mid-write never leaves a torn file
+    tmp = f.with_suffix(".json.tmp")
+    tmp.write_bytes(_json_dumps({"session_id": session_id}) + b"\n")
+    os.replace(tmp, f)
+    _saved_sessions[agent_name] = session_id
 
 
 # ── MCP config ───────────────────────────────────────────────
@@ -287,23 +338,31 @@ def write_mcp_config(
         }
     }
     config_path = _BRIDGE_DIR / f".mcp-config-{agent_id}.json"
-    config_path.write_text(json.dumps(config))
+    payload = _json_dumps(config)
+    # Leave an identical file untouched (no rewrite, no mtime bump)
+    try:
+        if config_path.read_bytes() == payload:
+            return config_path
+    except OSError:
+        pass
+    config_path.write_bytes(payload)
     return config_path
 
 
 # ── Claude CLI ───────────────────────────────────────────────
 
 def build_claude_cmd(
-    prompt: str,
     mcp_config: Path,
     system_prompt: str,
     session_id: str | None = None,
     model: str | None = None,
     max_turns: int = 15,
 ) -> list[str]:
-    """Build the claude CLI command."""
+    """Build the claude CLI command for a long-lived stream-json session.
+    Prompts are written to stdin as stream-json user messages, one per line."""
     cmd = [
         "claude", "-p",
+        "--input-format", "stream-json",
         "--output-format", "stream-json",
         "--verbose",
         "--permission-mode", "bypassPermissions",
@@ -317,123 +376,262 @@ def build_claude_cmd(
         cmd.extend(["--model", model])
     if session_id:
         cmd.extend(["--resume", session_id])
-    cmd.append(prompt)
     return cmd
 
 
+_COMPACT_JSON = json.JSONEncoder(separators=(",", ":"))
+
+
+def _short_json(obj, limit: int = 80) -> str:
+    """Compact JSON of obj for a log line, cut to `limit` chars with "...".
+    Encodes incrementally and stops once past the limit, so a huge tool input
+    (e.g. a blueprint string) is not serialized in full just to be truncated."""
+    parts = []
+    size = 0
+    for chunk in _COMPACT_JSON.iterencode(obj):
+        parts.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return "".join(parts)[:limit - 3] + "..."
+    return "".join(parts)
+
+
 def _ts():
     """Short timestamp for log lines."""
-    return datetime.now().strftime("%H:%M:%S")
+    return time.strftime("%H:%M:%S")
+
+
+_PIPE_BUFSIZE = 1 << 16
+
+# Environment for claude workers, built once (.env is already loaded above).
+# CLAUDECODE is unset to allow nested invocation.
+_CLAUDE_ENV = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
+
+# Tool names from the factorioctl MCP server arrive as mcp__factorioctl__<tool>
+_MCP_PREFIX = "mcp__factorioctl__"
+# Tool results echoed back as user frames; handle_message never reads them
+_USER_FRAME_PREFIX = b'{"type":"user"'
+
+
+class ClaudeWorker:
+    """One long-lived claude CLI process per agent.
+
+    Spawning claude per message paid Node startup, the MCP handshake and a
+    session resume on every turn. The worker spawns once and feeds each prompt
+    over stdin; if the process dies it is respawned on the next message,
+    resuming the last session id seen."""
+
+    def __init__(self, mcp_config: Path, system_prompt: str,
+                 session_id: str | None = None, model: str | None = None,
+                 max_turns: int = 15):
+        self.mcp_config = mcp_config
+        self.system_prompt = system_prompt
+        self.session_id = session_id
+        self.model = model
+        self.max_turns = max_turns
+        self.proc: subprocess.Popen | None = None
+        self._stderr: collections.deque[bytes] = collections.deque()
+        self._stderr_thread: threading.Thread | None = None
+
+    def _spawn(self):
+        cmd = build_claude_cmd(self.mcp_config, self.system_prompt,
+                               self.session_id, self.model, self.max_turns)
+        # Absolute path + close_fds=False lets CPython use posix_spawn (vfork)
+        # instead of fork+exec. Safe: Python opens fds non-inheritable by default.
+        claude_bin = shutil.which(cmd[0])
+        if not claude_bin:
+            raise FileNotFoundError(cmd[0])
+        cmd[0] = claude_bin
+        resume_tag = f" (resume {self.session_id[:8]}...)" if self.session_id else " (new session)"
+        print(f"  [{_ts()}] Spawning claude{resume_tag}")
+
+        # Binary pipes: stream-json lines go to the JSON parser as bytes, so
+        # UTF-8 is decoded once (by the parser) instead of by a TextIOWrapper too.
+        # 64 KB pipe buffer: tool_result frames are often many KB per line.
+        self.proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, env=_CLAUDE_ENV, bufsize=_PIPE_BUFSIZE,
+            close_fds=False,
+        )
+        with _active_procs_lock:
+            _active_procs.append(self.proc)
+
+        # Drain stderr as it arrives: a chatty process would otherwise fill
+        # the pipe while we block on stdout, and stall mid-turn
+        self._stderr = collections.deque(maxlen=1024)
+        self._stderr_thread = threading.Thread(
+            target=self._stderr.extend, args=(iter(self.proc.stderr.readline, b""),),
+            name="claude-stderr", daemon=True,
+        )
+        self._stderr_thread.start()
+
+    def warm(self):
+        """Spawn ahead of the first message so it skips startup latency.
+        A spawn failure is only logged; submit() retries and reports it."""
+        if self.proc is None:
+            try:
+                self._spawn()
+            except OSError as e:
+                print(f"  [{_ts()}] Could not start claude: {e}")
+
+    def submit(self, prompt: str):
+        """Write a prompt to the worker, spawning it first if needed.
+        Raises FileNotFoundError if the claude CLI is not installed."""
+        if self.proc is None or self.proc.poll() is not None:
+            self.reap()
+            self._spawn()
+        else:
+            # Keep error replies to this turn's stderr, not everything since spawn
+            self._stderr.clear()
+        frame = {"type": "user", "message": {"role": "user", "content": prompt}}
+        try:
+            self.proc.stdin.write(_json_dumps(frame) + b"\n")
+            self.proc.stdin.flush()
+        except OSError:
+            pass  # process died; read_turn() sees EOF and the caller reaps
+
+    def read_turn(self):
+        """Yield stream-json messages until this turn's result message.
+        Ends early (without a result) if the process exits."""
+        for line in self.proc.stdout:
+            # These can carry whole tool outputs; skip them without decoding
+            if line.startswith(_USER_FRAME_PREFIX):
+                continue
+            # Both parsers accept the trailing newline; blank lines fail and are skipped
+            try:
+                msg = _json_loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield msg
+            if msg.get("type") == "result":
+                self.session_id = msg.get("session_id", self.session_id)
+                return
+
+    def reap(self) -> str:
+        """Clean up an exited (or stuck) process. Returns its stderr output."""
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return ""
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        with _active_procs_lock:
+            if proc in _active_procs:
+                _active_procs.remove(proc)
+        # MCP server children can hold the pipe open past exit; don't hang on them
+        if self._stderr_thread:
+            self._stderr_thread.join(timeout=1)
+        return b"".join(self._stderr).decode("utf-8", errors="replace")
 
 
 def handle_message(
     prompt: str,
-    mcp_config: Path,
-    system_prompt: str,
-    session_id: str | None,
+    worker: ClaudeWorker,
     rcon: RCONClient,
     player_index: int,
     telemetry: Telemetry | None,
     agent_name: str = "default",
     telemetry_name: str | None = None,
     response_to: str | None = None,
-    model: str | None = None,
-    max_turns: int = 15,
 ) -> str | None:
-    """Pipe a message through claude CLI. Returns new session_id.
+    """Pipe a message through the agent's claude worker. Returns the session_id.
     agent_name: registered agent name (for RCON/mod).
     telemetry_name: display name for telemetry/logs (defaults to agent_name).
     response_to: if set, send response to this tab instead of agent_name (group chat)."""
     tname = telemetry_name or agent_name
     rcon_target = response_to or agent_name
-    cmd = build_claude_cmd(prompt, mcp_config, system_prompt, session_id, model, max_turns)
-
-    resume_tag = f" (resume {session_id[:8]}...)" if session_id else " (new session)"
-    print(f"  [{_ts()}] Spawning claude{resume_tag}")
-
-    # Unset CLAUDECODE to allow nested invocation
-    env = os.environ.copy()
-    env.pop("CLAUDECODE", None)
 
     try:
-        proc = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            env=env, text=True,
-        )
-        with _active_procs_lock:
-            _active_procs.append(proc)
+        worker.submit(prompt)
     except FileNotFoundError:
         print("[Error] 'claude' CLI not found. Install: npm install -g @anthropic-ai/claude-code")
         if player_index > 0:
             send_response(rcon, player_index, rcon_target, "Error: claude CLI not installed")
-        return session_id
-
-    text_parts = []
-    new_session_id = session_id
-
-    # Parse streaming JSON output line by line
-    for line in proc.stdout:
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            msg = json.loads(line)
-        except json.JSONDecodeError:
-            continue
-
+        return worker.session_id
+
+    raw_parts = []   # text blocks as received (for de-duplicating the result text)
+    text_parts = []  # the same blocks, sanitized
+    got_result = False
+    # Stream text blocks to the agent's own tab as they arrive (not to group chat)
+    stream = player_index > 0 and not response_to
+    streamed = False
+    last_tool_status = None  # skip RCON when the same tools are called back-to-back
+    log: list[str] = []  # console lines for the current frame, written in one go
+
+    # Parse streaming JSON output message by message
+    for msg in worker.read_turn():
         msg_type = msg.get("type")
 
         if msg_type == "assistant":
             # Assistant message with content blocks
+            frame_tools = []  # tools called in this frame, sent as one status update
             for block in msg.get("message", {}).get("content", []):
                 if block.get("type") == "text":
-                    text_parts.append(block["text"])
+                    raw_parts.append(block["text"])
                     # Show first ~80 chars of text as it streams
                     preview = block["text"][:80].replace("\n", " ")
-                    print(f"  [{_ts()}] text: {preview}{'...' if len(block['text']) > 80 else ''}")
+                    log.append(f"  [{_ts()}] text: {preview}{'...' if len(block['text']) > 80 else ''}")
+                    # Sanitized once here; the final reply reuses the pieces
+                    piece = sanitize_response(block["text"])
+                    if piece:
+                        text_parts.append(piece)
+                    if piece and stream:
+                        try:
+                            stream_response(rcon, player_index, agent_name,
+                                            ("\n\n" if streamed else "") + piece)
+                            streamed = True
+                        except Exception:
+                            pass
                 elif block.get("type") == "tool_use":
                     tool_name = block.get("name", "")
-                    display = tool_name
-                    if display.startswith("mcp__factorioctl__"):
-                        display = display[18:]
+                    display = tool_name.removeprefix(_MCP_PREFIX)
                     tool_input = block.get("input", {})
-                    input_summary = json.dumps(tool_input, separators=(",", ":"))
-                    if len(input_summary) > 80:
-                        input_summary = input_summary[:77] + "..."
-                    print(f"  [{_ts()}] tool: {display}({input_summary})")
+                    input_summary = _short_json(tool_input)
+                    log.append(f"  [{_ts()}] tool: {display}({input_summary})")
                     # Only emit select tools to telemetry (broadcast_thought = agent narration)
                     if display == "broadcast_thought":
                         thought = tool_input.get("message", "")
                         if thought:
                             emit_chat(telemetry, "agent", thought, agent=tname)
-                    # Send tool status to agent's own tab (not to group chat "all" tab)
+                    # Tool status goes to agent's own tab (not to group chat "all" tab)
                     # Skip for injected messages (player_index=0) — no GUI to update
-                    if player_index > 0 and (not tool_name.startswith("mcp__") or tool_name.startswith("mcp__factorioctl__")):
-                        try:
-                            send_tool_status(rcon, player_index, agent_name, display)
-                        except Exception:
-                            pass
+                    if (player_index > 0 and display not in frame_tools
+                            and (display != tool_name or not tool_name.startswith("mcp__"))):
+                        frame_tools.append(display)
+            status = ", ".join(frame_tools)
+            if status and status != last_tool_status:
+                last_tool_status = status
+                try:
+                    send_tool_status(rcon, player_index, agent_name, status)
+                except Exception:
+                    pass
 
         elif msg_type == "tool_result":
             # Tool execution result
             content = msg.get("content", "")
             if isinstance(content, str):
                 preview = content[:100].replace("\n", " ")
+                if len(content) > 100:
+                    preview += "..."
             else:
-                preview = str(content)[:100]
-            print(f"  [{_ts()}] result: {preview}{'...' if len(str(content)) > 100 else ''}")
+                # Structured output: encode only as much as the preview needs
+                preview = _short_json(content, limit=103)
+            log.append(f"  [{_ts()}] result: {preview}")
 
         elif msg_type == "result":
             # Final result message
+            got_result = True
             result_text = msg.get("result", "")
-            if result_text and result_text not in text_parts:
-                text_parts.append(result_text)
-            new_session_id = msg.get("session_id", session_id)
+            if result_text and result_text not in raw_parts:
+                raw_parts.append(result_text)
+                piece = sanitize_response(result_text)
+                if piece:
+                    text_parts.append(piece)
             cost = msg.get("total_cost_usd")
             duration = msg.get("duration_ms")
             turns = msg.get("num_turns")
             if cost is not None:
-                print(f"  [{_ts()}] done: ${cost:.4f} | {turns} turns | {(duration or 0)/1000:.1f}s")
+                log.append(f"  [{_ts()}] done: ${cost:.4f} | {turns} turns | {(duration or 0)/1000:.1f}s")
                 # Emit as compute_cost — routed to funding meter, not log feed
                 if telemetry:
                     telemetry.emit({
@@ -446,36 +644,36 @@ def handle_message(
                         "agent": tname,
                     })
 
-    proc.wait()
-    with _active_procs_lock:
-        if proc in _active_procs:
-            _active_procs.remove(proc)
+        if log:
+            sys.stdout.write("\n".join(log) + "\n")
+            log.clear()
 
-    if proc.returncode != 0:
-        stderr = proc.stderr.read()
-        if stderr and not text_parts:
-            error_msg = f"Error: {stderr[:200]}"
+    if not got_result:
+        # Worker exited mid-turn; it is respawned on the next message
+        stderr = worker.reap()
+        if stderr and not raw_parts:
+            # The fatal error is at the end of stderr
+            error_msg = f"Error: {stderr.rstrip()[-200:]}"
             print(f"[Error] {stderr.strip()}")
             emit_error(telemetry, error_msg, agent=tname)
             if player_index > 0:
+                # receive_response sets the status back to Ready in the mod
                 send_response(rcon, player_index, rcon_target, error_msg)
-                set_status(rcon, player_index, "[color=0.4,0.8,0.4]Ready[/color]")
-            return new_session_id
+            return worker.session_id
 
     # Send response — join all text parts so intermediate messages aren't lost
     reply = "\n\n".join(text_parts) if text_parts else "(action complete)"
-    reply = sanitize_response(reply)
 
     print(f"[{tname}] {reply}\n")
-    sections = parse_response(reply)
-    emit_chat(telemetry, "agent", reply, agent=tname, sections=sections)
+    if telemetry:  # sections only feed telemetry
+        emit_chat(telemetry, "agent", reply, agent=tname, sections=parse_response(reply))
     # For group chat, prefix reply with agent name so reader knows who said what
     if response_to:
         reply = f"[color=1,0.6,0.2]{tname}:[/color] {reply}"
     if player_index > 0:
         send_response(rcon, player_index, rcon_target, reply)
 
-    return new_session_id
+    return worker.session_id
 
 
 # ── Telemetry ────────────────────────────────────────────────
@@ -507,6 +705,32 @@ def build_telemetry(args) -> Telemetry | None:
     return None
 
 
+# ── Message batching ─────────────────────────────────────────
+
+def coalesce_messages(msgs: list[dict]) -> list[dict]:
+    """Merge messages from the same player to the same agent (and group-chat
+    route) into one prompt, joined with newlines, so a burst of lines costs one
+    claude turn. Order of first arrival is kept; other fields come from the first."""
+    merged: dict[tuple, dict] = {}
+    for msg in msgs:
+        key = (msg.get("target_agent"), msg.get("player_index", 1), msg.get("response_to"))
+        if key in merged:
+            merged[key]["message"] += "\n" + msg["message"]
+        else:
+            merged[key] = dict(msg)
+    return list(merged.values())
+
+
+def poll_batch(watcher: InputWatcher, batch_window: float) -> list[dict]:
+    """Poll the watcher; if anything arrived, wait batch_window once more to
+    catch lines landing mid-poll, then coalesce."""
+    msgs = watcher.poll()
+    if msgs and batch_window > 0:
+        time.sleep(batch_window)
+        msgs += watcher.poll()
+    return coalesce_messages(msgs)
+
+
 # ── Multi-agent mode ─────────────────────────────────────────
 
 # Planet order follows natural game progression
@@ -531,11 +755,11 @@ def discover_agents(group: str | None = None, names: list[str] | None = None) ->
     profiles = []
     for f in agents_dir.glob("*.json"):
         try:
-            agent = json.loads(f.read_text())
+            agent = _json_loads(f.read_bytes())
         except (json.JSONDecodeError, OSError):
             continue
         if agent.get("group") == group:
-            profiles.append(load_agent(agent["name"]))
+            profiles.append(_finalize_agent(agent, f))
     if not profiles:
         raise ValueError(f"No agents found with group '{group}'")
     profiles.sort(key=_agent_sort_key)
@@ -546,18 +770,27 @@ class AgentThread:
     """Manages one agent's claude CLI sessions in a dedicated thread."""
 
     def __init__(self, agent: dict, mcp_config: Path | None, rcon,
-                 telemetry: 'Telemetry | None', model: str | None):
+                 telemetry: 'Telemetry | None', model: str | None,
+                 max_turns: int | None = None):
         self.agent = agent
         self.agent_name = agent["name"]
         self.system_prompt = agent["system_prompt"]
+        # CLI flags override agent profile
         self.model = model or agent.get("model")
-        self.max_turns = agent.get("max_turns", 15)
+        self.max_turns = max_turns or agent.get("max_turns", 15)
         self.telemetry_name = agent.get("telemetry_name", self.agent_name)
         self.mcp_config = mcp_config
         self.rcon = rcon
         self.telemetry = telemetry
         self.session_id = load_session(self.agent_name)
-        self.inbox: queue.Queue = queue.Queue()
+        self.worker = None
+        if mcp_config:
+            self.worker = ClaudeWorker(mcp_config, self.system_prompt, self.session_id,
+                                       self.model, self.max_turns)
+        # Single producer (watcher) / single consumer (this thread): a deque
+        # plus a wake-up event is enough, no Queue locking per message
+        self.inbox: collections.deque[dict] = collections.deque()
+        self._wake = threading.Event()
         self._thread = threading.Thread(
             target=self._run, name=f"agent-{self.agent_name}", daemon=True,
         )
@@ -566,66 +799,139 @@ class AgentThread:
         self._thread.start()
 
     def enqueue(self, msg: dict):
-        self.inbox.put(msg)
+        self.inbox.append(msg)
+        self._wake.set()
 
     def _run(self):
+        if self.worker:
+            self.worker.warm()
         while True:
-            msg = self.inbox.get()
-            player_index = msg.get("player_index", 1)
-            player_name = msg.get("player_name", "Player")
-            message = msg["message"]
-            response_to = msg.get("response_to")  # Group chat routing
-
-            target_label = response_to or self.agent_name
-            print(f"[{player_name} -> {target_label}:{self.agent_name}] {message}" if response_to
-                  else f"[{player_name} -> {self.agent_name}] {message}")
-            emit_chat(self.telemetry, "player", message, agent=self.telemetry_name)
-
-            # player_index=0 means injected message (supervisor/API), skip GUI updates
-            if player_index > 0:
+            self._wake.wait()
+            # Clear before draining so an enqueue racing the drain re-arms it
+            self._wake.clear()
+            # Fold in anything that queued up while the previous turn ran
+            batch = []
+            while self.inbox:
+                batch.append(self.inbox.popleft())
+            for msg in coalesce_messages(batch):
+                # One failed message (e.g. RCON reconnect refused) must not kill the thread
                 try:
-                    set_status(self.rcon, player_index, "[color=1,0.8,0.2]Thinking...[/color]")
-                except Exception:
-                    pass
+                    self._handle(msg)
+                except Exception as e:
+                    print(f"[Error] {self.agent_name}: {e}")
+                    emit_error(self.telemetry, f"Error: {e}", agent=self.telemetry_name)
+                    # The turn may be half-read; respawn (with --resume) on the next message
+                    if self.worker:
+                        self.worker.reap()
+                    player_index = msg.get("player_index", 1)
+                    if player_index > 0:
+                        # receive_response clears the stream label and resets the status
+                        try:
+                            send_response(self.rcon, player_index,
+                                          msg.get("response_to") or self.agent_name, f"Error: {e}")
+                        except Exception:
+                            pass
+
+    def _handle(self, msg: dict):
+        player_index = msg.get("player_index", 1)
+        player_name = msg.get("player_name", "Player")
+        message = msg["message"]
+        response_to = msg.get("response_to")  # Group chat routing
+
+        target_label = response_to or self.agent_name
+        print(f"[{player_name} -> {target_label}:{self.agent_name}] {message}" if response_to
+              else f"[{player_name} -> {self.agent_name}] {message}")
+        emit_chat(self.telemetry, "player", message, agent=self.telemetry_name)
+
+        # player_index=0 means injected message (supervisor/API), skip GUI updates
+        if not self.worker:
+            # No "Thinking..." first: the error reply resets the status anyway
+            rcon_target = response_to or self.agent_name
+            if player_index > 0:
+                send_response(self.rcon, player_index, rcon_target,
+                              "Error: factorioctl MCP not found")
+            return
+
+        if player_index > 0:
+            try:
+                set_status(self.rcon, player_index, "[color=1,0.8,0.2]Thinking...[/color]")
+            except Exception:
+                pass
+
+        new_session = handle_message(
+            message, self.worker, self.rcon, player_index, self.telemetry,
+            agent_name=self.agent_name, telemetry_name=self.telemetry_name,
+            response_to=response_to,
+        )
+        if new_session:
+            self.session_id = new_session
+            save_session(self.agent_name, self.session_id)
+
+
+def _agent_mcp_config(args, mcp_bin: str | None, agent_name: str) -> str | None:
+    """Write the per-agent MCP config, or None when running chat-only."""
+    if not mcp_bin:
+        return None
+    return write_mcp_config(
+        mcp_bin, args.rcon_host, args.rcon_port,
+        args.rcon_password, agent_id=agent_name,
+    )
 
-            if not self.mcp_config:
-                rcon_target = response_to or self.agent_name
-                if player_index > 0:
-                    send_response(self.rcon, player_index, rcon_target,
-                                  "Error: factorioctl MCP not found")
-                continue
 
-            new_session = handle_message(
-                message, self.mcp_config, self.system_prompt, self.session_id,
-                self.rcon, player_index, self.telemetry,
-                agent_name=self.agent_name, telemetry_name=self.telemetry_name,
-                response_to=response_to, model=self.model, max_turns=self.max_turns,
-            )
-            if new_session:
-                self.session_id = new_session
-                save_session(self.agent_name, self.session_id)
+def _input_watcher(args) -> InputWatcher:
+    """Resolve script-output and open a watcher on the chat input file."""
+    script_output = Path(args.script_output) if args.script_output else find_script_output()
+    input_file = script_output / "claude-chat" / "input.jsonl"
+    input_file.parent.mkdir(parents=True, exist_ok=True)
+    return InputWatcher(input_file)
+
+
+def _run_watch_loop(args, watcher: InputWatcher, rcon, agents: dict[str, AgentThread],
+                    group_chat: bool = False):
+    """Route incoming messages to agent threads until Ctrl+C, then clean up.
+    group_chat: fan "all" messages out to every agent and warn on unknown targets."""
+    print(f"\nWatching for messages... (Ctrl+C to stop)\n")
+
+    try:
+        while True:
+            watcher.wait(args.poll_interval)
+            for msg in poll_batch(watcher, args.batch_window):
+                target = msg.get("target_agent", "default")
+                if group_chat and target == "all":
+                    # Fan out to all agents with staggered delivery
+                    for i, at in enumerate(agents.values()):
+                        at.enqueue({**msg, "response_to": "all"})
+                        if i < len(agents) - 1:
+                            time.sleep(1)  # stagger to avoid RCON flood
+                elif target in agents:
+                    agents[target].enqueue(msg)
+                elif group_chat:
+                    print(f"[warn] Message for unknown agent '{target}', dropping")
+    except (KeyboardInterrupt, SystemExit):
+        print("\nShutting down...")
+    finally:
+        _kill_all_subprocesses()
+        rcon.close()
+        print("Done.")
 
 
 def main_multi(args, agent_profiles: list[dict]):
     """Multi-agent mode: one thread per agent, shared watcher."""
-    # Shared RCON (thread-safe)
+    # Shared RCON pool (thread-safe), no more connections than agents
     print("Connecting to Factorio RCON...")
-    rcon_raw = RCONClient(args.rcon_host, args.rcon_port, args.rcon_password)
-    rcon = ThreadSafeRCON(rcon_raw)
+    rcon = RCONPool(args.rcon_host, args.rcon_port, args.rcon_password,
+                    size=min(args.rcon_connections, len(agent_profiles)))
     print("RCON connected!")
 
-    mod_loaded = check_mod_loaded(rcon)
+    # Mod probe + group chat + agents + default removal in one round-trip
+    # (unregister must happen after registers so safety check passes)
+    labels = [(a["name"], a.get("planet", a["name"]).capitalize()) for a in agent_profiles]
+    mod_loaded = register_agents(rcon, [("all", "ALL")] + labels, unregister=["default"])
     if mod_loaded:
         print("claude-interface mod detected!")
-        # Register group chat + agents first, THEN remove default
-        # (unregister must happen after registers so safety check passes)
-        register_agent(rcon, "all", label="ALL")
         print(f"  Registered tab:   all (group chat)")
-        for agent in agent_profiles:
-            label = agent.get("planet", agent["name"]).capitalize()
-            register_agent(rcon, agent["name"], label=label)
-            print(f"  Registered agent: {agent['name']} [{label}]")
-        unregister_agent(rcon, "default")
+        for name, label in labels:
+            print(f"  Registered agent: {name} [{label}]")
     else:
         print("WARNING: claude-interface mod not detected.")
 
@@ -657,27 +963,18 @@ def main_multi(args, agent_profiles: list[dict]):
     mcp_bin = args.factorioctl_mcp or find_factorioctl_mcp()
     agents: dict[str, AgentThread] = {}
     for agent in agent_profiles:
-        mcp_config = None
-        if mcp_bin:
-            mcp_config = write_mcp_config(
-                mcp_bin, args.rcon_host, args.rcon_port,
-                args.rcon_password, agent_id=agent["name"],
-            )
-        at = AgentThread(agent, mcp_config, rcon, telemetry, args.model)
+        mcp_config = _agent_mcp_config(args, mcp_bin, agent["name"])
+        at = AgentThread(agent, mcp_config, rcon, telemetry, args.model, args.max_turns)
         agents[agent["name"]] = at
 
-    # Resolve paths and start watcher
-    script_output = Path(args.script_output) if args.script_output else find_script_output()
-    input_file = script_output / "claude-chat" / "input.jsonl"
-    input_file.parent.mkdir(parents=True, exist_ok=True)
-    watcher = InputWatcher(input_file)
+    watcher = _input_watcher(args)
 
     # Banner
     agent_names = ", ".join(a["name"] for a in agent_profiles)
     print(f"\nClaude-in-Factorio — multi-agent")
     print(f"  Agents:      {agent_names}")
     print(f"  RCON:        {args.rcon_host}:{args.rcon_port}")
-    print(f"  Input:       {input_file}")
+    print(f"  Input:       {watcher.input_file}")
     if mcp_bin:
         print(f"  MCP server:  {mcp_bin}")
 
@@ -690,29 +987,7 @@ def main_multi(args, agent_profiles: list[dict]):
         if stagger > 0 and i < len(agents) - 1:
             time.sleep(stagger)
 
-    print(f"\nWatching for messages... (Ctrl+C to stop)\n")
-
-    try:
-        while True:
-            time.sleep(args.poll_interval)
-            for msg in watcher.poll():
-                target = msg.get("target_agent", "default")
-                if target == "all":
-                    # Fan out to all agents with staggered delivery
-                    for i, at in enumerate(agents.values()):
-                        at.enqueue({**msg, "response_to": "all"})
-                        if i < len(agents) - 1:
-                            time.sleep(1)  # stagger to avoid RCON flood
-                elif target in agents:
-                    agents[target].enqueue(msg)
-                else:
-                    print(f"[warn] Message for unknown agent '{target}', dropping")
-    except (KeyboardInterrupt, SystemExit):
-        print("\nShutting down...")
-    finally:
-        _kill_all_subprocesses()
-        rcon.close()
-        print("Done.")
+    _run_watch_loop(args, watcher, rcon, agents, group_chat=True)
 
 
 def _sync_mod():
@@ -732,7 +1007,7 @@ def _sync_mod():
             count += 1
 
     # Read version from info.json
-    info = json.loads((src / "info.json").read_text())
+    info = _json_loads((src / "info.json").read_bytes())
     ver = info.get("version", "?")
     print(f"Synced claude-interface v{ver} ({count} files)")
     print(f"  {src} -> {dst}")
@@ -760,6 +1035,8 @@ def main():
     parser.add_argument("--model", default=None, help="Claude model (e.g. sonnet, opus, haiku)")
     parser.add_argument("--max-turns", type=int, default=None, help="Max tool-use turns per message")
     parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--batch-window", type=float, default=0.1,
+                        help="Extra wait after new input to merge a burst of lines into one turn (0=off)")
     parser.add_argument("--factorioctl-mcp", default=None)
     parser.add_argument("--sse", action="store_true")
     parser.add_argument("--sse-port", type=int, default=8088)
@@ -767,6 +1044,8 @@ def main():
     parser.add_argument("--relay-token", default=None)
     parser.add_argument("--setup-surfaces", action="store_true",
                         help="Create planet surfaces before placing agents (for fresh worlds)")
+    parser.add_argument("--rcon-connections", type=int, default=4,
+                        help="Multi-agent mode: RCON connections shared by agent threads")
     parser.add_argument("--stagger-delay", type=float, default=3.0,
                         help="Seconds between agent startups to avoid RCON flood (0=instant)")
     parser.add_argument("--spectator", action="store_true",
@@ -805,28 +1084,19 @@ def main():
     # Single-agent mode
     agent = load_agent(args.agent or "default")
     agent_name = agent["name"]
-    system_prompt = agent["system_prompt"]
-
-    # CLI flags override agent profile
     model = args.model or agent.get("model")
-    max_turns = args.max_turns or agent.get("max_turns", 15)
-    telemetry_name = agent.get("telemetry_name", agent_name)
 
     # Load persisted session
     session_id = load_session(agent_name)
 
-    # Resolve paths
-    script_output = Path(args.script_output) if args.script_output else find_script_output()
     mcp_bin = args.factorioctl_mcp or find_factorioctl_mcp()
-
-    input_file = script_output / "claude-chat" / "input.jsonl"
-    input_file.parent.mkdir(parents=True, exist_ok=True)
+    watcher = _input_watcher(args)
 
     # Banner
     print(f"Claude-in-Factorio — {agent_name}")
     print(f"  Agent:       {agent_name}")
     print(f"  RCON:        {args.rcon_host}:{args.rcon_port}")
-    print(f"  Input:       {input_file}")
+    print(f"  Input:       {watcher.input_file}")
     if session_id:
         print(f"  Session:     {session_id[:12]}... (resumed)")
     else:
@@ -838,13 +1108,12 @@ def main():
     else:
         print("  MCP server:  not found (chat-only)")
 
-    # RCON
+    # RCON (thread-safe: the agent thread and this loop both use it)
     print("\nConnecting to Factorio RCON...")
-    rcon = RCONClient(args.rcon_host, args.rcon_port, args.rcon_password)
+    rcon = ThreadSafeRCON(RCONClient(args.rcon_host, args.rcon_port, args.rcon_password))
     print("RCON connected!")
-    if check_mod_loaded(rcon):
+    if register_agents(rcon, [(agent_name, None)]):
         print("claude-interface mod detected!")
-        register_agent(rcon, agent_name)
         print(f"  Registered agent: {agent_name}")
     else:
         print("WARNING: claude-interface mod not detected.")
@@ -857,62 +1126,13 @@ def main():
     # Telemetry
     telemetry = build_telemetry(args)
 
-    # MCP config
-    mcp_config = None
-    if mcp_bin:
-        mcp_config = write_mcp_config(
-            mcp_bin, args.rcon_host, args.rcon_port,
-            args.rcon_password, agent_id=agent_name,
-        )
-
-    # Watcher
-    watcher = InputWatcher(input_file)
-
-    print(f"\nWatching for messages... (Ctrl+C to stop)\n")
-
-    try:
-        while True:
-            time.sleep(args.poll_interval)
-
-            for msg in watcher.poll():
-                target = msg.get("target_agent", "default")
-                if target != agent_name:
-                    continue
-
-                player_index = msg.get("player_index", 1)
-                player_name = msg.get("player_name", "Player")
-                message = msg["message"]
+    # Agent runs in its own thread so the watcher keeps reading (and
+    # batching) input while a turn is in progress
+    mcp_config = _agent_mcp_config(args, mcp_bin, agent_name)
+    agent_thread = AgentThread(agent, mcp_config, rcon, telemetry, args.model, args.max_turns)
+    agent_thread.start()
 
-                print(f"[{player_name} -> {agent_name}] {message}")
-                emit_chat(telemetry, "player", message, agent=telemetry_name)
-
-                if player_index > 0:
-                    try:
-                        set_status(rcon, player_index, "[color=1,0.8,0.2]Thinking...[/color]")
-                    except Exception:
-                        pass
-
-                if not mcp_config:
-                    if player_index > 0:
-                        send_response(rcon, player_index, agent_name, "Error: factorioctl MCP not found")
-                    continue
-
-                new_session = handle_message(
-                    message, mcp_config, system_prompt, session_id,
-                    rcon, player_index, telemetry,
-                    agent_name=agent_name, telemetry_name=telemetry_name,
-                    model=model, max_turns=max_turns,
-                )
-                if new_session:
-                    session_id = new_session
-                    save_session(agent_name, session_id)
-
-    except (KeyboardInterrupt, SystemExit):
-        print("\nShutting down...")
-    finally:
-        _kill_all_subprocesses()
-        rcon.close()
-        print("Done.")
+    _run_watch_loop(args, watcher, rcon, {agent_name: agent_thread})
 
 
 if __name__ == "__main__":
@@ -1,7 +1,19 @@
 """Source RCON protocol client for Factorio and Lua string encoding."""
 
+import collections
+import functools
+import re
 import socket
 import struct
+import threading
+
+# Receive buffer size; grows if a single packet is larger
+_RX_BUFSIZE = 1 << 16
+
+# Packet layout: size, request id, type (little-endian int32), body, two NULs
+_HEADER = struct.Struct("<iii")
+_SIZE = struct.Struct("<i")
+_ID_TYPE = struct.Struct("<ii")
 
 
 class RCONClient:
@@ -22,37 +34,70 @@ class RCONClient:
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.settimeout(30)
         self.sock.connect((self.host, self.port))
+        # Commands are small request/response packets: don't let Nagle or
+        # delayed ACKs hold them back. Keepalive surfaces half-dead peers
+        # as errors, which triggers the reconnect path.
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_QUICKACK"):  # Linux only
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        # Receive buffer: one recv_into can pick up several queued responses
+        # (batch() pipelines them); [_rx_start:_rx_end] holds unread bytes
+        self._rx = bytearray(_RX_BUFSIZE)
+        self._rx_view = memoryview(self._rx)
+        self._rx_start = self._rx_end = 0
         self._authenticate()
 
     def _next_id(self) -> int:
         self._request_id += 1
         return self._request_id
 
-    def _send_packet(self, packet_type: int, body: str) -> int:
+    def _build_packet(self, packet_type: int, body: str) -> tuple[int, bytearray]:
         req_id = self._next_id()
         body_bytes = body.encode("utf-8")
         size = 4 + 4 + len(body_bytes) + 1 + 1
-        packet = struct.pack("<iii", size, req_id, packet_type) + body_bytes + b"\x00\x00"
+        # Filled in place: the body is copied once, the NUL terminators are the zero fill
+        packet = bytearray(4 + size)
+        _HEADER.pack_into(packet, 0, size, req_id, packet_type)
+        packet[_HEADER.size:_HEADER.size + len(body_bytes)] = body_bytes
+        return req_id, packet
+
+    def _send_packet(self, packet_type: int, body: str) -> int:
+        req_id, packet = self._build_packet(packet_type, body)
         self.sock.sendall(packet)
         return req_id
 
     def _recv_packet(self) -> tuple[int, int, str]:
         raw = self._recv_bytes(4)
-        (size,) = struct.unpack("<i", raw)
+        (size,) = _SIZE.unpack(raw)
         data = self._recv_bytes(size)
-        req_id = struct.unpack("<i", data[0:4])[0]
-        pkt_type = struct.unpack("<i", data[4:8])[0]
+        req_id, pkt_type = _ID_TYPE.unpack_from(data)
         body = data[8:-2].decode("utf-8", errors="replace")
         return req_id, pkt_type, body
 
     def _recv_bytes(self, n: int) -> bytes:
-        buf = b""
-        while len(buf) < n:
-            chunk = self.sock.recv(n - len(buf))
-            if not chunk:
+        if self._rx_end - self._rx_start < n:
+            self._fill(n)
+        start = self._rx_start
+        self._rx_start = start + n
+        return bytes(self._rx_view[start:start + n])
+
+    def _fill(self, n: int):
+        """Read from the socket until at least n unread bytes are buffered."""
+        avail = self._rx_end - self._rx_start
+        if self._rx_start:
+            # Move the unread tail to the front (same-size slice assignment)
+            self._rx[:avail] = self._rx_view[self._rx_start:self._rx_end]
+            self._rx_start, self._rx_end = 0, avail
+        if n > len(self._rx):
+            self._rx_view.release()
+            self._rx.extend(bytes(n - len(self._rx)))
+            self._rx_view = memoryview(self._rx)
+        while self._rx_end < n:
+            got = self.sock.recv_into(self._rx_view[self._rx_end:])
+            if not got:
                 raise ConnectionError("RCON connection closed")
-            buf += chunk
-        return buf
+            self._rx_end += got
 
     def _authenticate(self):
         self._send_packet(self.SERVERDATA_AUTH, self.password)
@@ -73,6 +118,32 @@ class RCONClient:
             _, _, body = self._recv_packet()
             return body
 
+    def batch(self, commands: list[str]) -> list[str]:
+        """Pipeline several commands in one round-trip.
+        All packets go out back-to-back, then responses are matched by request id.
+        Returns bodies in the same order as commands."""
+        if not commands:
+            return []
+        try:
+            return self._batch(commands)
+        except (ConnectionError, socket.timeout, OSError):
+            print("[bridge] RCON disconnected, reconnecting...")
+            self._connect()
+            return self._batch(commands)
+
+    def _batch(self, commands: list[str]) -> list[str]:
+        # One sendall for the whole batch instead of one per packet
+        ids, packets = zip(*(self._build_packet(self.SERVERDATA_EXECCOMMAND, c) for c in commands))
+        self.sock.sendall(b"".join(packets))
+        pending = set(ids)
+        bodies: dict[int, str] = {}
+        while pending:
+            req_id, _, body = self._recv_packet()
+            if req_id in pending:
+                pending.discard(req_id)
+                bodies[req_id] = body
+        return [bodies[i] for i in ids]
+
     def close(self):
         if self.sock:
             self.sock.close()
@@ -82,7 +153,6 @@ class ThreadSafeRCON:
     """Thread-safe wrapper around RCONClient. Duck-type compatible."""
 
     def __init__(self, rcon: RCONClient, lock=None):
-        import threading
         self._rcon = rcon
         self._lock = lock or threading.Lock()
 
@@ -90,14 +160,78 @@ class ThreadSafeRCON:
         with self._lock:
             return self._rcon.execute(command)
 
+    def batch(self, commands: list[str]) -> list[str]:
+        with self._lock:
+            return self._rcon.batch(commands)
+
     def close(self):
         self._rcon.close()
 
 
+class RCONPool:
+    """A few RCON connections shared by agent threads, so one agent's
+    command doesn't queue behind another's. Duck-type compatible with
+    RCONClient. Each batch() runs on a single connection, keeping its order."""
+
+    def __init__(self, host: str, port: int, password: str, size: int = 4):
+        self._pool = collections.deque(
+            (RCONClient(host, port, password), threading.Lock()) for _ in range(max(1, size))
+        )
+        self._pool_lock = threading.Lock()
+
+    def _acquire(self) -> tuple[RCONClient, threading.Lock]:
+        """Take the first idle connection in round-robin order, else wait on the next one."""
+        with self._pool_lock:
+            for _ in range(len(self._pool)):
+                client, lock = self._pool[0]
+                self._pool.rotate(-1)
+                if lock.acquire(blocking=False):
+                    return client, lock
+            client, lock = self._pool[0]
+            self._pool.rotate(-1)
+        lock.acquire()
+        return client, lock
+
+    def execute(self, command: str) -> str:
+        client, lock = self._acquire()
+        try:
+            return client.execute(command)
+        finally:
+            lock.release()
+
+    def batch(self, commands: list[str]) -> list[str]:
+        client, lock = self._acquire()
+        try:
+            return client.batch(commands)
+        finally:
+            lock.release()
+
+    def close(self):
+        for client, _ in self._pool:
+            client.close()
+
+
+# Every "]=*]" run in the text, plus a trailing "]=*" that would run into the
+# closing bracket. Lookahead so overlapping runs ("]]=]") are all seen.
+_CLOSE_BRACKET_RE = re.compile(r"\](?=(=*)(?:\]|\Z))")
+
+
 def lua_long_string(text: str) -> str:
     """Wrap text in a Lua long bracket string with auto-detected level."""
-    level = 0
-    while f']{"=" * level}]' in text:
-        level += 1
+    # One scan: pick a level above every closing bracket the text contains
+    level = max((len(m.group(1)) for m in _CLOSE_BRACKET_RE.finditer(text)), default=-1) + 1
     eq = "=" * level
+    # Lua drops a newline right after the opening bracket; give it one to drop.
+    # A leading "\r" needs "\r\n", since "\n\r" would be skipped as one newline.
+    if text[:1] == "\n":
+        text = "\n" + text
+    elif text[:1] == "\r":
+        text = "\r\n" + text
     return f"[{eq}[{text}]{eq}]"
+
+
+@functools.lru_cache(maxsize=256)
+def lua_long_string_cached(text: str) -> str:
+    """lua_long_string for short values drawn from a small set
+    (agent names, tool names, status strings). Not for reply text."""
+    return lua_long_string(text)
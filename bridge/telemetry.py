@@ -1,42 +1,80 @@
 """Telemetry bus: local SSE server and remote relay pusher."""
 
-import json
+import collections
+import http.client
 import queue
 import threading
-from datetime import datetime, timezone
+import time
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+from jsonio import dumps as _json_dumps
+
+_KEEPALIVE = b": keepalive\n\n"
+
+# Max events per relay POST
+_RELAY_BATCH_MAX = 100
+
+
+# (epoch second, formatted UTC timestamp); events in a burst share one strftime
+_ts_cache: tuple[int, str] = (0, "")
+
+
+def _utc_timestamp() -> str:
+    global _ts_cache
+    sec = int(time.time())
+    cached_sec, text = _ts_cache
+    if sec != cached_sec:
+        text = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _ts_cache = (sec, text)
+    return text
+
+
+def _encode_event(event: dict) -> bytes:
+    """Timestamp (if missing) and serialize an event to compact JSON bytes."""
+    if "timestamp" not in event:
+        event["timestamp"] = _utc_timestamp()
+    return _json_dumps(event)
 
 
 class SSEBroadcaster:
     """Manages SSE client connections and broadcasts events."""
 
     def __init__(self):
-        self._clients: list[queue.Queue] = []
+        # One bounded deque per client (oldest frames drop if a client lags);
+        # a single condition wakes all client handlers per broadcast
+        self._clients: dict[int, collections.deque] = {}  # id(deque) -> deque
         self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
 
-    def add_client(self) -> queue.Queue:
-        q: queue.Queue = queue.Queue(maxsize=200)
+    def add_client(self) -> collections.deque:
+        dq: collections.deque = collections.deque(maxlen=200)
         with self._lock:
-            self._clients.append(q)
-        return q
+            self._clients[id(dq)] = dq
+        return dq
 
-    def remove_client(self, q: queue.Queue):
+    def remove_client(self, dq: collections.deque):
         with self._lock:
-            self._clients = [c for c in self._clients if c is not q]
-
-    def broadcast(self, event: dict):
-        if "timestamp" not in event:
-            event["timestamp"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
-        data = json.dumps(event, separators=(",", ":"))
-        with self._lock:
-            dead = []
-            for q in self._clients:
-                try:
-                    q.put_nowait(data)
-                except queue.Full:
-                    dead.append(q)
-            for q in dead:
-                self._clients.remove(q)
+            self._clients.pop(id(dq), None)
+
+    def next_frames(self, dq: collections.deque, timeout: float) -> list[bytes]:
+        """Wait up to `timeout` for frames on a client's deque and take them all.
+        Returns [] on timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: dq, timeout)
+            frames = list(dq)
+            dq.clear()
+        return frames
+
+    def broadcast(self, event: dict | bytes):
+        """Queue an event for every client. Accepts a dict or pre-encoded JSON bytes."""
+        data = event if isinstance(event, bytes) else _encode_event(event)
+        # Wire frame built once here, not per client in the handler
+        frame = b"data: " + data + b"\n\n"
+        with self._cond:
+            for dq in self._clients.values():
+                dq.append(frame)
+            self._cond.notify_all()
 
     @property
     def client_count(self) -> int:
@@ -55,27 +93,22 @@ def _make_sse_handler(broadcaster: SSEBroadcaster):
                 self.send_header("Access-Control-Allow-Origin", "*")
                 self.end_headers()
 
-                q = broadcaster.add_client()
+                dq = broadcaster.add_client()
                 try:
                     while True:
-                        try:
-                            data = q.get(timeout=15)
-                            self.wfile.write(f"data: {data}\n\n".encode())
-                            self.wfile.flush()
-                        except queue.Empty:
-                            self.wfile.write(b": keepalive\n\n")
-                            self.wfile.flush()
+                        frames = broadcaster.next_frames(dq, timeout=15)
+                        self.wfile.write(b"".join(frames) if frames else _KEEPALIVE)
+                        self.wfile.flush()
                 except (BrokenPipeError, ConnectionResetError, OSError):
                     pass
                 finally:
-                    broadcaster.remove_client(q)
+                    broadcaster.remove_client(dq)
             elif self.path == "/health":
                 self.send_response(200)
                 self.send_header("Content-Type", "application/json")
                 self.send_header("Access-Control-Allow-Origin", "*")
                 self.end_headers()
-                resp = json.dumps({"status": "ok", "clients": broadcaster.client_count})
-                self.wfile.write(resp.encode())
+                self.wfile.write(_json_dumps({"status": "ok", "clients": broadcaster.client_count}))
             else:
                 self.send_response(404)
                 self.end_headers()
@@ -108,23 +141,43 @@ class RelayPusher:
     def __init__(self, relay_url: str, token: str):
         self.ingest_url = relay_url.rstrip("/") + "/ingest"
         self.token = token
+        # One keep-alive connection reused across batches (no handshake per POST)
+        url = urlsplit(self.ingest_url)
+        self._conn_cls = (http.client.HTTPSConnection if url.scheme == "https"
+                          else http.client.HTTPConnection)
+        self._netloc = url.netloc
+        self._path = url.path + (f"?{url.query}" if url.query else "")
+        self._conn: http.client.HTTPConnection | None = None
+        # Built once, not per batch
+        self._headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "User-Agent": "bore-bridge/1.0",
+        }
         self._queue: queue.Queue = queue.Queue(maxsize=500)
+        # Events dropped because the queue was full (relay slow or down)
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
         self._thread = threading.Thread(target=self._push_loop, daemon=True)
         self._thread.start()
 
-    def push(self, event: dict):
+    def push(self, event: dict | bytes):
+        """Non-blocking: never stalls the caller on the network.
+        Accepts a dict or pre-encoded JSON bytes."""
+        if not isinstance(event, bytes):
+            event = _encode_event(event)
         try:
             self._queue.put_nowait(event)
         except queue.Full:
-            pass
+            with self._dropped_lock:
+                self._dropped += 1
 
     def _push_loop(self):
-        import urllib.request as urlreq
         while True:
-            batch: list[dict] = []
+            batch: list[bytes] = []
             try:
                 batch.append(self._queue.get(timeout=2))
-                while len(batch) < 20:
+                while len(batch) < _RELAY_BATCH_MAX:
                     batch.append(self._queue.get_nowait())
             except queue.Empty:
                 pass
@@ -132,21 +185,40 @@ class RelayPusher:
             if not batch:
                 continue
 
-            data = json.dumps(batch).encode()
-            req = urlreq.Request(
-                self.ingest_url,
-                data=data,
-                headers={
-                    "Authorization": f"Bearer {self.token}",
-                    "Content-Type": "application/json",
-                    "User-Agent": "bore-bridge/1.0",
-                },
-                method="POST",
-            )
+            data = b"[" + b",".join(batch) + b"]"
             try:
-                urlreq.urlopen(req, timeout=5)
+                status = self._post(data)
+                if status >= 400:
+                    print(f"[relay] push failed: HTTP {status}")
             except Exception as e:
                 print(f"[relay] push failed: {e}")
+            with self._dropped_lock:
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                print(f"[relay] dropped {dropped} events (queue full)")
+
+    def _post(self, data: bytes) -> int:
+        """POST one batch on the kept-alive connection. Returns the HTTP status.
+        Retries once on a fresh connection if the server dropped the idle one."""
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = self._conn_cls(self._netloc, timeout=5)
+            try:
+                self._conn.request("POST", self._path, body=data, headers=self._headers)
+                resp = self._conn.getresponse()
+                resp.read()
+                return resp.status
+            # Not ConnectionResetError: a reset can follow a POST the relay already
+            # processed, and resending would duplicate the batch
+            except (http.client.RemoteDisconnected, BrokenPipeError):
+                self._conn.close()
+                self._conn = None
+                if attempt:
+                    raise
+            except Exception:
+                self._conn.close()
+                self._conn = None
+                raise
 
 
 class Telemetry:
@@ -157,12 +229,12 @@ class Telemetry:
         self.relay = relay
 
     def emit(self, event: dict):
-        if "timestamp" not in event:
-            event["timestamp"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        # Serialized once; SSE and relay share the same immutable bytes
+        payload = _encode_event(event)
         if self.sse:
-            self.sse.broadcast(dict(event))
+            self.sse.broadcast(payload)
         if self.relay:
-            self.relay.push(dict(event))
+            self.relay.push(payload)
 
 
 # Telemetry helpers — all safe to call with telemetry=None
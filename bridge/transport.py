@@ -1,62 +1,155 @@
 """Bridge <-> Factorio game transport: RCON commands out, JSONL file in."""
 
+import ctypes
+import ctypes.util
+import itertools
 import json
+import os
+import select
+import sys
+import time
 from pathlib import Path
 
-from rcon import RCONClient, lua_long_string
+from jsonio import loads as _json_loads
+from rcon import RCONClient, lua_long_string, lua_long_string_cached
+
+_MOD_CHECK_CMD = '/silent-command rcon.print(remote.interfaces["claude_interface"] and "yes" or "no")'
+
+# remote.call command templates; arguments are Lua literals (ints or long strings)
+_CALL = '/silent-command remote.call("claude_interface", '
+_RECEIVE_RESPONSE_CMD = _CALL + '"receive_response", %d, %s, %s)'
+# Chunked replies: every part names its reply, so replies pipelined on different
+# pool connections don't interleave in the mod's buffer.
+_APPEND_RESPONSE_ID_CMD = _CALL + '"append_response", %d, %s, %s, "%s")'
+_RECEIVE_RESPONSE_ID_CMD = _CALL + '"receive_response", %d, %s, %s, "%s")'
+_STREAM_RESPONSE_CMD = _CALL + '"stream_response", %d, %s, %s)'
+_TOOL_STATUS_CMD = _CALL + '"tool_status", %d, %s, %s)'
+_SET_STATUS_CMD = _CALL + '"set_status", %d, %s)'
+_REGISTER_AGENT_CMD = _CALL + '"register_agent", %s)'
+_REGISTER_AGENT_LABEL_CMD = _CALL + '"register_agent", %s, %s)'
+_UNREGISTER_AGENT_CMD = _CALL + '"unregister_agent", %s)'
+
+
+# Factorio caps RCON command size (~4 KB); leave headroom for the remote.call wrapper
+RESPONSE_CHUNK_BYTES = 3000
+
+# Ids for chunked replies; the pid keeps them apart from parts a previous bridge
+# process left unfinished in the save.
+_REPLY_ID_PREFIX = f"{os.getpid()}-"
+_reply_ids = itertools.count(1)
+
+
+def _utf8_chunks(text: str, limit: int) -> list[str]:
+    """Split text into pieces of at most `limit` UTF-8 bytes.
+    Encodes once and walks a single index; never cuts inside a code point."""
+    data = text.encode("utf-8")
+    n = len(data)
+    chunks = []
+    i = 0
+    while i < n:
+        j = min(i + limit, n)
+        while j < n and (data[j] & 0xC0) == 0x80:  # continuation byte
+            j -= 1
+        chunks.append(data[i:j].decode("utf-8"))
+        i = j
+    return chunks
 
 
 def send_response(rcon: RCONClient, player_index: int, agent_name: str, text: str):
-    encoded = lua_long_string(text)
-    agent_encoded = lua_long_string(agent_name)
-    lua = f'/silent-command remote.call("claude_interface", "receive_response", {player_index}, {agent_encoded}, {encoded})'
-    rcon.execute(lua)
+    """Send a reply to the player's chat tab. Long replies are split into
+    append_response chunks plus a final receive_response, pipelined in one batch."""
+    agent_encoded = lua_long_string_cached(agent_name)
+    chunks = _utf8_chunks(text, RESPONSE_CHUNK_BYTES) or [""]
+    if len(chunks) == 1:
+        rcon.execute(_RECEIVE_RESPONSE_CMD % (player_index, agent_encoded, lua_long_string(chunks[0])))
+        return
+    reply_id = f"{_REPLY_ID_PREFIX}{next(_reply_ids)}"
+    cmds = [
+        _APPEND_RESPONSE_ID_CMD % (player_index, agent_encoded, lua_long_string(chunk), reply_id)
+        for chunk in chunks[:-1]
+    ]
+    cmds.append(_RECEIVE_RESPONSE_ID_CMD % (player_index, agent_encoded, lua_long_string(chunks[-1]), reply_id))
+    rcon.batch(cmds)
+
+
+def stream_response(rcon: RCONClient, player_index: int, agent_name: str, text: str):
+    """Append interim reply text to the agent tab's in-progress label.
+    The label is replaced by the final message on the next send_response."""
+    agent_encoded = lua_long_string_cached(agent_name)
+    cmds = [
+        _STREAM_RESPONSE_CMD % (player_index, agent_encoded, lua_long_string(chunk))
+        for chunk in _utf8_chunks(text, RESPONSE_CHUNK_BYTES)
+    ]
+    if len(cmds) == 1:
+        rcon.execute(cmds[0])
+    elif cmds:
+        rcon.batch(cmds)
 
 
 def send_tool_status(rcon: RCONClient, player_index: int, agent_name: str, tool_name: str):
-    agent_encoded = lua_long_string(agent_name)
-    encoded = lua_long_string(tool_name)
-    lua = f'/silent-command remote.call("claude_interface", "tool_status", {player_index}, {agent_encoded}, {encoded})'
-    rcon.execute(lua)
+    rcon.execute(_TOOL_STATUS_CMD % (player_index, lua_long_string_cached(agent_name), lua_long_string_cached(tool_name)))
 
 
 def set_status(rcon: RCONClient, player_index: int, status: str):
-    encoded = lua_long_string(status)
-    lua = f'/silent-command remote.call("claude_interface", "set_status", {player_index}, {encoded})'
-    rcon.execute(lua)
+    rcon.execute(_SET_STATUS_CMD % (player_index, lua_long_string_cached(status)))
 
 
-def register_agent(rcon: RCONClient, agent_name: str, label: str | None = None):
-    encoded = lua_long_string(agent_name)
+def _register_agent_cmd(agent_name: str, label: str | None = None) -> str:
     if label:
-        label_encoded = lua_long_string(label)
-        lua = f'/silent-command remote.call("claude_interface", "register_agent", {encoded}, {label_encoded})'
-    else:
-        lua = f'/silent-command remote.call("claude_interface", "register_agent", {encoded})'
-    rcon.execute(lua)
+        return _REGISTER_AGENT_LABEL_CMD % (lua_long_string_cached(agent_name), lua_long_string_cached(label))
+    return _REGISTER_AGENT_CMD % lua_long_string_cached(agent_name)
+
+
+def _unregister_agent_cmd(agent_name: str) -> str:
+    return _UNREGISTER_AGENT_CMD % lua_long_string_cached(agent_name)
+
+
+def register_agent(rcon: RCONClient, agent_name: str, label: str | None = None):
+    rcon.execute(_register_agent_cmd(agent_name, label))
 
 
 def unregister_agent(rcon, agent_name: str):
-    encoded = lua_long_string(agent_name)
-    lua = f'/silent-command remote.call("claude_interface", "unregister_agent", {encoded})'
-    rcon.execute(lua)
+    rcon.execute(_unregister_agent_cmd(agent_name))
+
+
+def register_agents(rcon, agents: list[tuple[str, str | None]],
+                    unregister: list[str] | None = None) -> bool:
+    """Probe for the mod and register agents (name, label) in one pipelined batch.
+    Unregisters run after the registers so the mod's last-agent guard passes.
+    If the mod is missing the remote.call commands fail harmlessly.
+    Returns True if the mod was detected."""
+    cmds = [_MOD_CHECK_CMD]
+    cmds += [_register_agent_cmd(name, label) for name, label in agents]
+    cmds += [_unregister_agent_cmd(name) for name in unregister or []]
+    results = rcon.batch(cmds)
+    return results[0].strip() == "yes"
 
 
 def setup_surfaces(rcon, planets: list[str]) -> dict[str, str]:
     """Ensure planet surfaces exist. Creates them if missing.
-    Returns {planet: status} where status is 'exists' or 'created'."""
-    results = {}
-    for planet in planets:
-        lua = (
-            f'local p = game.planets["{planet}"] '
-            f'if not p then rcon.print("no_planet") return end '
-            f'if game.surfaces["{planet}"] then rcon.print("exists") return end '
-            f'p.create_surface() '
-            f'rcon.print("created")'
-        )
-        result = rcon.execute(f'/silent-command {lua}').strip()
-        results[planet] = result
-    return results
+    Returns {planet: status} where status is 'exists', 'created' or 'no_planet'.
+    All planets are handled by one Lua loop in a single RCON call."""
+    if not planets:
+        return {}
+    names = ", ".join(lua_long_string(planet) for planet in planets)
+    lua = (
+        f'local results = {{}} '
+        f'for _, name in ipairs({{{names}}}) do '
+        f'local p = game.planets[name] '
+        f'if not p then results[name] = "no_planet" '
+        f'elseif game.surfaces[name] then results[name] = "exists" '
+        f'else p.create_surface() results[name] = "created" end '
+        f'end '
+        f'rcon.print(helpers.table_to_json(results))'
+    )
+    result = rcon.execute(f'/silent-command {lua}').strip()
+    try:
+        parsed = _json_loads(result)
+    except json.JSONDecodeError:
+        # Lua error text instead of JSON: report it against every planet
+        parsed = {}
+    # Caller's order (table_to_json's is arbitrary); a missing planet gets the raw reply
+    return {planet: parsed.get(planet, result) for planet in planets}
 
 
 def pre_place_character(rcon, agent_name: str, planet: str, spawn_offset: int = 0) -> str:
@@ -102,38 +195,149 @@ def set_spectator_mode(rcon, enabled: bool = True):
 
 
 def check_mod_loaded(rcon) -> bool:
-    result = rcon.execute(
-        '/silent-command rcon.print(remote.interfaces["claude_interface"] and "yes" or "no")'
-    )
+    result = rcon.execute(_MOD_CHECK_CMD)
     return result.strip() == "yes"
 
 
+# inotify event masks (linux/inotify.h)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_CREATE = 0x00000100
+
+# With change notifications, still re-check this often in case an event is missed
+_EVENT_RECHECK_SECONDS = 30.0
+
+
+def _inotify_open(directory: Path) -> int | None:
+    """Open a non-blocking inotify fd watching a directory for file writes.
+    Returns None where inotify is unavailable (non-Linux, no libc)."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_CREATE
+        if libc.inotify_add_watch(fd, str(directory).encode(), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def _kqueue_watch(kq, path: Path) -> int | None:
+    """Register a vnode watch for writes to `path` on a kqueue (macOS/BSD).
+    Returns the watched fd (closing it drops the watch), or None if unavailable."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    event = select.kevent(
+        fd, filter=select.KQ_FILTER_VNODE,
+        flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+        fflags=(select.KQ_NOTE_WRITE | select.KQ_NOTE_EXTEND
+                | select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME),
+    )
+    try:
+        kq.control([event], 0, 0)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
 class InputWatcher:
     def __init__(self, input_file: Path):
         self.input_file = input_file
         self.last_size = 0
         if input_file.exists():
             self.last_size = input_file.stat().st_size
+        self._fh = None       # kept open across polls, opened lazily
+        self._partial = b""   # trailing bytes of a line not yet terminated
+        self._notify_fd = _inotify_open(input_file.parent)
+        # kqueue fallback: watch the directory (file created/replaced) and the
+        # file itself (appends), since directory events don't cover content
+        self._kq = None
+        self._kq_dir_fd = self._kq_file_fd = None
+        if self._notify_fd is None and hasattr(select, "kqueue"):
+            self._kq = select.kqueue()
+            self._kq_dir_fd = _kqueue_watch(self._kq, input_file.parent)
+            if self._kq_dir_fd is None:
+                self._kq.close()
+                self._kq = None
+            else:
+                self._kq_file_fd = _kqueue_watch(self._kq, input_file)
+
+    def wait(self, timeout: float):
+        """Block until the input file changes. Without change notifications
+        (inotify or kqueue) this is a plain sleep of `timeout` (the poll interval)."""
+        if self._notify_fd is not None:
+            ready, _, _ = select.select([self._notify_fd], [], [], _EVENT_RECHECK_SECONDS)
+            if ready:
+                try:
+                    os.read(self._notify_fd, 65536)  # drain queued events
+                except BlockingIOError:
+                    pass
+        elif self._kq is not None:
+            events = self._kq.control(None, 8, _EVENT_RECHECK_SECONDS)
+            if self._kq_file_fd is None or any(e.ident == self._kq_dir_fd for e in events):
+                # File appeared or was replaced: move the content watch to it
+                if self._kq_file_fd is not None:
+                    os.close(self._kq_file_fd)
+                self._kq_file_fd = _kqueue_watch(self._kq, self.input_file)
+        else:
+            time.sleep(timeout)
 
     def poll(self) -> list[dict]:
-        if not self.input_file.exists():
-            return []
-        current_size = self.input_file.stat().st_size
-        if current_size <= self.last_size:
+        """Return complete new messages appended since the last poll.
+        The file stays open between polls; a line still being written is
+        held back until its newline arrives."""
+        if self._fh is None and not self._open():
             return []
+        data = self._fh.read()
+        if not data:
+            # Read a replaced or truncated file now: its inotify event is already drained
+            if not self._check_replaced() or not self._open():
+                return []
+            data = self._fh.read()
+            if not data:
+                return []
+        self.last_size += len(data)
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
         messages = []
-        with open(self.input_file, "r") as f:
-            f.seek(self.last_size)
-            new_data = f.read()
-        self.last_size = current_size
-        for line in new_data.strip().split("\n"):
-            line = line.strip()
-            if not line:
+        for line in lines:
+            if not line.strip():
                 continue
             try:
-                msg = json.loads(line)
+                msg = _json_loads(line)
                 if msg.get("message"):
                     messages.append(msg)
             except json.JSONDecodeError:
                 continue
         return messages
+
+    def _open(self) -> bool:
+        try:
+            self._fh = open(self.input_file, "rb")
+        except FileNotFoundError:
+            return False
+        self._fh.seek(self.last_size)
+        return True
+
+    def _check_replaced(self) -> bool:
+        """Rewind to the start if the file was deleted, replaced or truncated.
+        Returns True if the handle was reset."""
+        try:
+            st = os.stat(self.input_file)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != os.fstat(self._fh.fileno()).st_ino or st.st_size < self.last_size:
+            self._fh.close()
+            self._fh = None
+            self.last_size = 0
+            self._partial = b""
+            return True
+        return False
@@ -16,6 +16,10 @@ local function init_storage()
     storage.agent_labels = storage.agent_labels or {}
     storage.active_agent = storage.active_agent or {}
     storage._rcon_queue = storage._rcon_queue or {}
+    -- Partial response chunks (long replies arrive split across RCON commands)
+    storage.response_parts = storage.response_parts or {}
+    -- In-progress reply text shown while the agent is still working
+    storage.streaming = storage.streaming or {}
     storage.spectator_mode = storage.spectator_mode or false
     -- Agent character entities and walk targets (for deterministic on_tick processing)
     storage.characters = storage.characters or {}
@@ -339,6 +343,36 @@ local function add_chat_message(player, agent_name, role, text)
     end
 end
 
+-- Show (or remove, when text is nil) the muted in-progress reply label at the
+-- bottom of an agent tab. Replaced by the real message when the reply completes.
+local function update_stream_label(player, agent_name, text)
+    local frame = player.gui.screen[GUI_FRAME]
+    if not frame or not frame.valid then return end
+    local chat_flow = get_agent_chat_flow(frame, agent_name)
+    if not chat_flow then return end
+
+    local label = chat_flow["ci_stream"]
+    if text == nil then
+        if label then label.destroy() end
+        return
+    end
+    local caption = "[color=0.6,0.6,0.6]" .. text .. "[/color]"
+    if label then
+        label.caption = caption
+    else
+        label = chat_flow.add{
+            type = "label",
+            name = "ci_stream",
+            caption = caption,
+        }
+        label.style.single_line = false
+        label.style.horizontally_stretchable = true
+    end
+
+    local scroll = get_agent_scroll(frame, agent_name)
+    if scroll then scroll.scroll_to_bottom() end
+end
+
 local function set_status(player, status_text)
     local frame = player.gui.screen[GUI_FRAME]
     if not frame or not frame.valid then return end
@@ -538,14 +572,43 @@ local function process_rcon_queue()
     for _, item in ipairs(queue) do
         -- Skip GUI updates for injected/synthetic messages (player_index=0)
         local pi = item.pi or 0
-        if item.type == "response" then
+        if item.type == "response_part" then
+            if not storage.response_parts then storage.response_parts = {} end
+            local key = item.reply_id or (pi .. ":" .. item.agent)
+            local parts = storage.response_parts[key] or {}
+            table.insert(parts, item.text)
+            storage.response_parts[key] = parts
+        elseif item.type == "response" then
+            -- Prepend any chunks received ahead of the final piece
+            local text = item.text
+            local key = pi .. ":" .. item.agent
+            -- Chunked replies carry their own id so concurrent replies don't mix parts
+            local parts_key = item.reply_id or key
+            local parts = storage.response_parts and storage.response_parts[parts_key]
+            if parts then
+                text = table.concat(parts) .. text
+                storage.response_parts[parts_key] = nil
+            end
+            if storage.streaming then storage.streaming[key] = nil end
             if pi > 0 then
                 local player = game.get_player(pi)
                 if player then
-                    add_chat_message(player, item.agent, "claude", item.text)
+                    update_stream_label(player, item.agent, nil)
+                    add_chat_message(player, item.agent, "claude", text)
                     set_status(player, "[color=0.4,0.8,0.4]Ready[/color]")
                 end
             end
+        elseif item.type == "stream" then
+            if pi > 0 then
+                local player = game.get_player(pi)
+                if player then
+                    if not storage.streaming then storage.streaming = {} end
+                    local key = pi .. ":" .. item.agent
+                    local text = (storage.streaming[key] or "") .. item.text
+                    storage.streaming[key] = text
+                    update_stream_label(player, item.agent, text)
+                end
+            end
         elseif item.type == "tool" then
             -- Tool calls only shown in status bar, not in chat log
             if pi > 0 then
@@ -611,9 +674,26 @@ end
 -- ============================================================
 
 remote.add_interface("claude_interface", {
-    receive_response = function(player_index, agent_name, text)
+    receive_response = function(player_index, agent_name, text, reply_id)
         table.insert(storage._rcon_queue, {
             type = "response", pi = player_index,
+            agent = agent_name or "default", text = text, reply_id = reply_id,
+        })
+    end,
+
+    -- Leading chunk of a long response; the final chunk arrives via receive_response
+    -- with the same reply_id
+    append_response = function(player_index, agent_name, text, reply_id)
+        table.insert(storage._rcon_queue, {
+            type = "response_part", pi = player_index,
+            agent = agent_name or "default", text = text, reply_id = reply_id,
+        })
+    end,
+
+    -- Interim reply text while the agent is still generating (shown muted)
+    stream_response = function(player_index, agent_name, text)
+        table.insert(storage._rcon_queue, {
+            type = "stream", pi = player_index,
             agent = agent_name or "default", text = text,
         })
     end,